@@ -1,271 +1,159 @@
 """
-Configuration file for Local Code Agent
-Copy this to config.py and customize as needed
+Configuration loader for Local Code Agent
+Copy this to config.py (and config.example.toml to config.toml) and customize as needed
 """
+import fnmatch
+import functools
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
 
-# Ollama Configuration
-OLLAMA_BASE_URL = "http://localhost:11434"
-DEFAULT_MODEL = "qwen2.5-coder:7b"
-
-# Model-specific settings
-MODEL_CONFIGS = {
-    "llama3.2:3b": {
-        "temperature": 0.7,
-        "num_predict": 2048,
-        "top_k": 40,
-        "top_p": 0.9,
-        "context_window": 4096,
-    },
-    "qwen2.5-coder:7b": {
-        "temperature": 0.5,  # Lower for more deterministic code
-        "num_predict": 3072,
-        "top_k": 40,
-        "top_p": 0.95,
-        "context_window": 8192,
-    },
-    "deepseek-coder-v2:16b": {
-        "temperature": 0.4,
-        "num_predict": 4096,
-        "top_k": 50,
-        "top_p": 0.95,
-        "context_window": 16384,
-    }
-}
-
-# Agent Behavior
-MAX_CONVERSATION_HISTORY = 10  # Number of messages to keep in context
-ENABLE_AUTO_TOOL_EXECUTION = True  # Auto-execute tool calls without confirmation
-STREAM_RESPONSE = True  # Stream tokens as they arrive
-SHOW_THINKING = True  # Show "Thinking..." spinner
-
-# File Operations
-MAX_FILE_SIZE_MB = 10  # Maximum file size to read (MB)
-ALLOWED_FILE_EXTENSIONS = [
-    # Code
-    '.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c', '.h',
-    '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala',
-    # Web
-    '.html', '.css', '.scss', '.sass', '.less',
-    # Config
-    '.json', '.yaml', '.yml', '.toml', '.ini', '.xml',
-    # Docs
-    '.md', '.txt', '.rst',
-    # Data
-    '.csv', '.tsv',
-    # Other
-    '.sh', '.bash', '.zsh', '.fish', '.sql'
-]
-
-IGNORED_DIRECTORIES = [
-    'node_modules', '__pycache__', '.git', '.venv', 'venv',
-    'dist', 'build', '.next', '.nuxt', 'target', 'bin', 'obj',
-    '.idea', '.vscode', '*.egg-info'
-]
-
-# Shell Commands
-COMMAND_TIMEOUT_SECONDS = 30
-SAFE_COMMANDS = [
-    'ls', 'cat', 'head', 'tail', 'grep', 'find', 'pwd',
-    'echo', 'git status', 'git log', 'git diff',
-    'python --version', 'node --version', 'npm --version'
-]
-
-# Dangerous commands that require confirmation
-DANGEROUS_COMMANDS = [
-    'rm', 'rmdir', 'del', 'format', 'dd', 'mv',
-    'chmod +x', 'sudo', 'su', 'shutdown', 'reboot'
-]
-
-# UI Configuration
-THEME = "monokai"  # Syntax highlighting theme
-SHOW_LINE_NUMBERS = True
-MAX_DISPLAY_LINES = 500  # Maximum lines to display for file contents
-TRUNCATE_LONG_OUTPUT = True
-
-# Colors
-COLOR_SCHEME = {
-    "user_prompt": "bold cyan",
-    "assistant": "bold green",
-    "system": "yellow",
-    "error": "red",
-    "success": "green",
-    "info": "blue",
-    "warning": "yellow"
-}
-
-# Custom System Prompt (optional)
-CUSTOM_SYSTEM_PROMPT = """
-You are an expert AI coding assistant specialized in:
-- Modern web development (React, Next.js, TypeScript)
-- Python development and data science
-- System administration and DevOps
-- Clean code practices and design patterns
-
-Your approach:
-1. Always explain your reasoning
-2. Provide code examples when relevant
-3. Suggest best practices
-4. Ask clarifying questions when needed
-5. Be concise but thorough
-
-When using tools:
-- Always explain what you're about to do
-- Show relevant code with syntax highlighting
-- Confirm before making destructive changes
-"""
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError as e:
+        raise ImportError("config.py needs tomli on Python < 3.11: pip install tomli") from e
+
+_HERE = Path(__file__).parent
+CONFIG_FILE = _HERE / "config.toml"
+if not CONFIG_FILE.exists():
+    CONFIG_FILE = _HERE / "config.example.toml"
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# Settings live in TOML; rebind them as module-level names so
+# `import config; config.DEFAULT_MODEL` keeps working. Containers are frozen
+# (tuples / read-only mappings); callers that need to mutate copy with dict().
+# The large tables are built on first access by __getattr__ (PEP 562) below.
+_LAZY = frozenset({"MODEL_CONFIGS", "MODEL_ALIASES", "FILE_TEMPLATES"})
+with open(CONFIG_FILE, "rb") as f:
+    _cfg = tomllib.load(f)
+globals().update({k: _freeze(v) for k, v in _cfg.items() if k not in _LAZY})
+
+# Precomputed so size checks during directory scans are a single int compare
+MAX_FILE_SIZE_BYTES = _cfg["MAX_FILE_SIZE_MB"] << 20
+
+
+@dataclass(frozen=True, slots=True)
+class ModelConfig:
+    temperature: float
+    num_predict: int
+    top_k: int
+    top_p: float
+    context_window: int
+    num_batch: int = 512
+    keep_alive: str = "30m"
+    tokens_per_sec_short: float = 0.0
+    tokens_per_sec_long: float = 0.0
+
+
+# Membership-tested collections become frozensets (one hash probe per lookup)
+ALLOWED_FILE_EXTENSIONS = frozenset(_cfg["ALLOWED_FILE_EXTENSIONS"])
+SAFE_COMMANDS = frozenset(_cfg["SAFE_COMMANDS"])
+DANGEROUS_COMMANDS = frozenset(_cfg["DANGEROUS_COMMANDS"])
+REQUIRE_CONFIRMATION_FOR = frozenset(_cfg["REQUIRE_CONFIRMATION_FOR"])
+
+# Glob entries (e.g. '*.egg-info') can't be hashed, so keep them apart and
+# compile them into one alternation here instead of matching per pattern.
+# Walkers prune with: dirs[:] = [d for d in dirs if not is_ignored_dir(d)]
+IGNORED_DIRS_EXACT = frozenset(d for d in _cfg["IGNORED_DIRECTORIES"] if not any(c in d for c in "*?["))
+IGNORED_DIR_GLOBS = tuple(d for d in _cfg["IGNORED_DIRECTORIES"] if d not in IGNORED_DIRS_EXACT)
+_IGNORED_DIR_GLOB_RE = re.compile("|".join(fnmatch.translate(g) for g in IGNORED_DIR_GLOBS) or r"(?!)")
+IGNORED_DIRECTORIES = IGNORED_DIRS_EXACT | frozenset(IGNORED_DIR_GLOBS)
+
+
+def is_ignored_dir(name: str) -> bool:
+    return name in IGNORED_DIRS_EXACT or _IGNORED_DIR_GLOB_RE.fullmatch(name) is not None
+
+
+# One compiled alternation per command list, so classifying a command is a
+# single scan instead of a Python loop over every pattern. Longest patterns
+# first so 'rmdir' wins over 'rm'.
+def _command_alternation(commands):
+    return "|".join(re.escape(c) for c in sorted(commands, key=len, reverse=True))
+
+
+_DANGEROUS_RE = re.compile(rf"(?<![\w.-])(?:{_command_alternation(DANGEROUS_COMMANDS)})(?![\w.-])")
+# The whole command must match: a safe prefix followed by arguments with no
+# chaining, pipes, redirection or substitution (;, &, |, <, >, `, $, newline)
+_SAFE_RE = re.compile(rf"\s*(?:{_command_alternation(SAFE_COMMANDS)})(?:\s[^;&|<>`$\n]*)?")
+
+
+def is_dangerous(command: str) -> bool:
+    return _DANGEROUS_RE.search(command) is not None
+
+
+def is_safe(command: str) -> bool:
+    return _SAFE_RE.fullmatch(command) is not None and not is_dangerous(command)
+
+
+# Interned keys: model-name lookups hit the identity fast path in dict probes
+def _build_MODEL_CONFIGS():
+    return MappingProxyType({sys.intern(k): ModelConfig(**v) for k, v in _cfg["MODEL_CONFIGS"].items()})
+
+
+def _build_MODEL_ALIASES():
+    return MappingProxyType({
+        **{sys.intern(k): sys.intern(v) for k, v in _cfg["MODEL_ALIASES"].items()},
+        "short_output": choose_model(1024, 128),
+        "long_output": choose_model(128, 1024),
+    })
+
+
+def _build_FILE_TEMPLATES():
+    return _freeze(_cfg["FILE_TEMPLATES"])
 
-# Logging
-ENABLE_LOGGING = True
-LOG_FILE = "agent.log"
-LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING, ERROR
-
-# Performance
-ENABLE_CACHING = True  # Cache model responses (experimental)
-CACHE_DIR = ".agent_cache"
-
-# Features
-FEATURES = {
-    "web_search": False,  # Coming soon
-    "git_integration": False,  # Coming soon
-    "database_tools": False,  # Coming soon
-    "api_testing": False,  # Coming soon
-}
-
-# Keyboard Shortcuts (for future GUI version)
-SHORTCUTS = {
-    "clear_history": "Ctrl+L",
-    "interrupt": "Ctrl+C",
-    "paste_mode": "Ctrl+V",
-    "run_last_command": "Ctrl+R"
-}
-
-# Custom Tools
-# Add your own tool definitions here
-CUSTOM_TOOLS = [
-    # Example:
-    # {
-    #     "name": "deploy_to_production",
-    #     "description": "Deploy the application to production",
-    #     "command": "bash scripts/deploy.sh",
-    #     "requires_confirmation": True
-    # }
-]
-
-# API Keys (for future integrations)
-API_KEYS = {
-    # "anthropic": "sk-...",  # For Claude API fallback
-    # "openai": "sk-...",     # For GPT fallback
-    # "github": "ghp_...",    # For GitHub integration
-}
-
-# Model Aliases
-MODEL_ALIASES = {
-    "fast": "llama3.2:3b",
-    "balanced": "qwen2.5-coder:7b",
-    "powerful": "deepseek-coder-v2:16b",
-    "default": "qwen2.5-coder:7b"
-}
-
-# Experimental Features
-EXPERIMENTAL = {
-    "multi_agent": False,  # Multiple agents working together
-    "auto_debug": False,   # Automatically debug failing code
-    "code_review": False,  # Automated code review
-    "refactoring": False,  # Suggest refactorings
-}
-
-# Session Settings
-AUTO_SAVE_HISTORY = True
-HISTORY_FILE = ".agent_history"
-MAX_HISTORY_SIZE = 1000
-
-# Context Awareness
-ANALYZE_PROJECT_STRUCTURE = True  # Auto-analyze project on start
-DETECT_LANGUAGE = True            # Auto-detect programming language
-SUGGEST_TOOLS = True              # Suggest relevant tools for tasks
-
-# Safety
-REQUIRE_CONFIRMATION_FOR = [
-    "delete_files",
-    "run_sudo",
-    "modify_system_files",
-    "commit_changes",
-    "push_to_remote"
-]
-
-SANDBOX_MODE = False  # Run all commands in isolated environment (requires Docker)
-
-# Advanced
-ENABLE_FUNCTION_CALLING = True  # Use structured function calling
-PARALLEL_TOOL_EXECUTION = False  # Execute multiple tools simultaneously
-MAX_PARALLEL_TOOLS = 3
-
-# Development
-DEBUG_MODE = False
-VERBOSE_LOGGING = False
-SHOW_RAW_RESPONSES = False  # Show raw model output
-
-# Custom Prompts for Specific Tasks
-TASK_PROMPTS = {
-    "refactor": "Focus on improving code quality, readability, and maintainability.",
-    "debug": "Carefully analyze the error and provide a step-by-step solution.",
-    "optimize": "Look for performance bottlenecks and suggest optimizations.",
-    "test": "Write comprehensive tests covering edge cases.",
-    "document": "Add clear, helpful documentation and docstrings."
-}
-
-# File Templates
-FILE_TEMPLATES = {
-    "python": """#!/usr/bin/env python3
-'''
-{filename}
-{description}
-'''
-
-def main():
-    pass
-
-if __name__ == "__main__":
-    main()
-""",
-    "javascript": """/**
- * {filename}
- * {description}
- */
-
-function main() {
-    // Your code here
-}
-
-main();
-""",
-}
-
-# Git Integration Settings
-GIT_CONFIG = {
-    "auto_commit": False,
-    "commit_message_template": "[Agent] {action}: {description}",
-    "auto_push": False,
-    "branch_prefix": "agent/"
-}
-
-# Project Defaults
-PROJECT_DEFAULTS = {
-    "python": {
-        "venv": ".venv",
-        "requirements": "requirements.txt",
-        "formatter": "black",
-        "linter": "pylint"
-    },
-    "javascript": {
-        "package_manager": "npm",
-        "formatter": "prettier",
-        "linter": "eslint"
+
+# Context-length-aware routing: pick the fastest model whose context window
+# fits prompt + output. Token counts are bucketed by bit length (powers of
+# two, sized by the bucket's upper bound) and every bucket pair is resolved
+# on first use, so choose_model() is then a single dict lookup.
+def _pick_model(configs, prompt_tokens, output_tokens):
+    fits = [k for k, c in configs.items() if c.context_window >= prompt_tokens + output_tokens]
+    if not fits:
+        return max(configs, key=lambda k: configs[k].context_window)
+    short = output_tokens <= SHORT_OUTPUT_TOKENS
+    return max(fits, key=lambda k: configs[k].tokens_per_sec_short if short else configs[k].tokens_per_sec_long)
+
+
+@functools.cache
+def _model_choices():
+    configs = __getattr__("MODEL_CONFIGS")
+    max_bucket = max(c.context_window for c in configs.values()).bit_length()
+    table = {
+        (p, o): _pick_model(configs, (1 << p) - 1, (1 << o) - 1)
+        for p in range(max_bucket + 1)
+        for o in range(max_bucket + 1)
     }
-}
+    return table, max_bucket
+
+
+def choose_model(prompt_tokens: int, expected_output_tokens: int) -> str:
+    table, max_bucket = _model_choices()
+    return table[min(prompt_tokens.bit_length(), max_bucket), min(expected_output_tokens.bit_length(), max_bucket)]
+
+
+@functools.cache
+def get_system_prompt() -> str:
+    return _HERE.joinpath(SYSTEM_PROMPT_FILE).read_text(encoding="utf-8")
+
 
-# Notes:
-# 1. To use this config, rename to config.py and import in your agent
-# 2. Sensitive data (API keys) should be in a separate .env file
-# 3. You can override any setting via command line arguments
-# 4. Settings marked "Coming soon" are placeholders for future features
\ No newline at end of file
+# Custom System Prompt (optional) is only read from disk when first accessed
+def __getattr__(name):
+    if name == "CUSTOM_SYSTEM_PROMPT":
+        return get_system_prompt()
+    if name in _LAZY:
+        value = globals()[name] = globals()[f"_build_{name}"]()
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
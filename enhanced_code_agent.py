@@ -1,30 +1,80 @@
 #!/usr/bin/env python3
-import json,os,subprocess,sys,re,requests,time,difflib
+import collections,fnmatch,functools,gzip,hashlib,heapq,itertools,json,math,mmap,operator,os,shlex,signal,stat,subprocess,sys,re,requests,threading,time,types,difflib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List,Dict,Optional,Callable
 from datetime import datetime
-try:
-    from rich.console import Console
-    from rich.markdown import Markdown
-    from rich.panel import Panel
-    from rich.prompt import Prompt,Confirm
-    from rich.syntax import Syntax
-    from rich.live import Live
-    from rich.spinner import Spinner
-    from rich.tree import Tree
-    from rich.table import Table
-except ImportError:
-    subprocess.check_call([sys.executable,"-m","pip","install","rich","--break-system-packages"])
-    from rich.console import Console
-    from rich.markdown import Markdown
-    from rich.panel import Panel
-    from rich.prompt import Prompt,Confirm
-    from rich.syntax import Syntax
-    from rich.live import Live
-    from rich.spinner import Spinner
-    from rich.tree import Tree
-    from rich.table import Table
-console=Console()
+def ensure_deps():
+    try:import rich
+    except ImportError:subprocess.check_call([sys.executable,"-m","pip","install","rich","--break-system-packages"])
+if __name__=="__main__":ensure_deps()
+from rich.console import Console,Group
+from rich.markdown import Markdown
+from rich.panel import Panel
+from rich.prompt import Prompt,Confirm
+from rich.syntax import Syntax
+from rich.live import Live
+from rich.spinner import Spinner
+from rich.tree import Tree
+from rich.table import Table
+from rich.text import Text
+from pygments.lexers import get_lexer_by_name,TextLexer
+from pygments.util import ClassNotFound
+try:from orjson import loads as json_loads,dumps as json_dumps
+except ImportError:json_loads=json.loads;json_dumps=lambda obj:json.dumps(obj).encode()
+class ThreadConsole(Console):
+    # Tool calls run on worker threads buffer their output here; the main thread replays it in call order
+    _local=threading.local()
+    def print(self,*args,**kwargs):
+        if(buffer:=getattr(self._local,'buffer',None))is not None:buffer.append((args,kwargs))
+        else:super().print(*args,**kwargs)
+console=ThreadConsole()
+
+def capture_output(func,*args)->tuple:
+    console._local.buffer=buffer=[]
+    try:return func(*args),buffer
+    finally:console._local.buffer=None
+
+def replay_output(buffer:list):
+    for args,kwargs in buffer:console.print(*args,**kwargs)
+TOOL_NAME_RE=re.compile(r'TOOL\[(\w+)\]')
+TOOL_CALL_RE=re.compile(r'TOOL\[(\w+)\]\(((?:[^()"\']|(?<=\\)["\']|(?<!\\)"[^"]*(?:(?<=\\)"[^"]*)*(?<!\\)"|(?<!\\)\'[^\']*(?:(?<=\\)\'[^\']*)*(?<!\\)\'|\((?:[^()"\']|(?<=\\)["\']|(?<!\\)"[^"]*(?:(?<=\\)"[^"]*)*(?<!\\)"|(?<!\\)\'[^\']*(?:(?<=\\)\'[^\']*)*(?<!\\)\')*\))*)\)',re.DOTALL)
+ARG_TOKEN_RE=re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*\\?)"?|\'([^\'\\]*(?:\\.[^\'\\]*)*\\?)\'?|[^"\'(),]+|[(),]',re.DOTALL)
+PAREN_RE=re.compile(r'[()]')
+CALL_DELIM_RE=re.compile(r'["\'()]')
+SIZE_UNITS=('B','KB','MB','GB','TB')
+WRITE_CHUNK_CHARS=1<<20
+DIFF_MAX_BYTES=1_000_000
+COMMAND_OUTPUT_CAP=64*1024
+ESCAPE_RE=re.compile(r'\\([ntr\\\'"0abfv])')
+ESCAPES={'n':'\n','t':'\t','r':'\r','\\':'\\',"'":"'",'"':'"','0':'\0','a':'\a','b':'\b','f':'\f','v':'\v'}
+DEFAULT_IGNORED_DIRS=frozenset({'node_modules','__pycache__','venv'})
+DIFF_STYLES={'+':'green','-':'red'}
+README_FILES=('README.md','README.txt','README')
+TECH_INDICATORS={'package.json':'Node.js/JavaScript','requirements.txt':'Python','Cargo.toml':'Rust','go.mod':'Go','pom.xml':'Java (Maven)','build.gradle':'Java (Gradle)','Gemfile':'Ruby'}
+READ_FLAGS=os.O_RDONLY|getattr(os,'O_BINARY',0)
+LONG_LINE_RE=re.compile(r'[^\n]{4096}')
+FILE_MENTION_RE=re.compile(r'@([\w\-./]+\.\w+)')
+PREFETCH_TOOLS=frozenset({'read_file','list_files','search_files','validate_python','show_todos'})
+HISTORY_FILE_RE=re.compile(r'(?:@|Successfully (?:wrote to|edited) |characters from )([\w\-./]+\.\w+)')
+SHELL_META_RE=re.compile(r'[|&;<>()$`*?\[\]{}~#!\n]|^\s*\w+=')
+
+@functools.cache
+def get_user_config():
+    try:import config;return config
+    except ImportError as e:
+        if e.name!='config':console.print(f"[yellow]⚠️config.py not loaded, using defaults: {e}[/yellow]")
+        return None
+
+def config_value(name:str,default=None):
+    return getattr(cfg,name,default)if(cfg:=get_user_config())else default
+
+MODEL_DEFAULTS={"temperature":0.7,"num_predict":2048,"top_k":40,"top_p":0.9,"context_window":4096,"num_batch":512,"keep_alive":"30m","tokens_per_sec_short":0.0,"tokens_per_sec_long":0.0}
+
+@functools.lru_cache(maxsize=32)
+def model_config(model:str):
+    cfg=config_value("MODEL_CONFIGS",{}).get(model)
+    return types.SimpleNamespace(**{**MODEL_DEFAULTS,**cfg})if isinstance(cfg,dict)else cfg
 
 class TokenTracker:
     def __init__(self):self.total_tokens=self.prompt_tokens=self.completion_tokens=0
@@ -35,42 +85,182 @@ def show_checkpoint(tool_name:str,message:str=""):
     console.print(f"\n[blue]⏺[/blue][bold]{tool_name}[/bold]")
     if message:console.print(f"[dim]⎿{message}[/dim]")
 
+def hunk_range(start:int,stop:int)->str:
+    if(length:=stop-start)==1:return f"{start+1}"
+    return f"{start+1 if length else start},{length}"
+
+def trimmed_matching_blocks(matcher,pre:int,a_end:int,b_end:int,suf:int)->list:
+    # get_matching_blocks() with the common prefix and suffix taken as given, so only the middle is searched
+    queue,blocks=[(pre,a_end,pre,b_end)],[]
+    while queue:
+        alo,ahi,blo,bhi=queue.pop();i,j,k=match=matcher.find_longest_match(alo,ahi,blo,bhi)
+        if k:
+            blocks.append(match)
+            if alo<i and blo<j:queue.append((alo,i,blo,j))
+            if i+k<ahi and j+k<bhi:queue.append((i+k,ahi,j+k,bhi))
+    merged=[(0,0,pre)]if pre else[]
+    for i,j,k in sorted(blocks)+([(a_end,b_end,suf)]if suf else[]):
+        if merged and merged[-1][0]+merged[-1][2]==i and merged[-1][1]+merged[-1][2]==j:merged[-1]=(*merged[-1][:2],merged[-1][2]+k)
+        else:merged.append((i,j,k))
+    return[difflib.Match(*block)for block in merged]+[difflib.Match(a_end+suf,b_end+suf,0)]
+
+def diff_lines(old:str,new:str,n:int=3):
+    a,b=old.splitlines(),new.splitlines();common=min(len(a),len(b))
+    pre=next((i for i,x,y in zip(range(common),a,b)if x!=y),common)
+    suf=next((i for i,x,y in zip(range(common-pre),reversed(a),reversed(b))if x!=y),common-pre)
+    matcher=difflib.SequenceMatcher(None,a,b);a_end,b_end=len(a)-suf,len(b)-suf
+    # difflib itself matches the prefix and suffix whole only when both middles are non-empty, share no line with
+    # them, and each has a line autojunk keeps as an anchor; otherwise it aligns the whole file
+    anchored=lambda lines:not lines or not matcher.bpopular.issuperset(lines)
+    if pre<a_end and pre<b_end and(middle:={*a[pre:a_end],*b[pre:b_end]}).isdisjoint(a[:pre])and middle.isdisjoint(a[a_end:])and anchored(a[:pre])and anchored(a[a_end:]):
+        matcher.matching_blocks=trimmed_matching_blocks(matcher,pre,a_end,b_end,suf)
+    for group in matcher.get_grouped_opcodes(n):
+        yield f"@@ -{hunk_range(group[0][1],group[-1][2])} +{hunk_range(group[0][3],group[-1][4])} @@"
+        for tag,i1,i2,j1,j2 in group:
+            if tag=='equal':yield from(' '+line for line in a[i1:i2]);continue
+            if tag!='insert':yield from('-'+line for line in a[i1:i2])
+            if tag!='delete':yield from('+'+line for line in b[j1:j2])
+
 def show_diff(old:str,new:str,filename:str):
-    old_lines,new_lines=old.splitlines(keepends=True),new.splitlines(keepends=True)
-    diff=difflib.unified_diff(old_lines,new_lines,lineterm='',n=3)
-    changes,diff_lines={'additions':0,'removals':0},[]
-    for line in diff:
-        if line.startswith('+++')or line.startswith('---'):continue
-        elif line.startswith('@@'):diff_lines.append(('header',line.strip()))
-        elif line.startswith('+'):changes['additions']+=1;diff_lines.append(('add',line))
-        elif line.startswith('-'):changes['removals']+=1;diff_lines.append(('remove',line))
-        else:diff_lines.append(('context',line))
-    if diff_lines:
-        console.print(f"[dim]⎿Updated {filename} with {changes['additions']} additions and {changes['removals']} removals[/dim]")
-        for dtype,line in diff_lines[:20]:
-            line_content=line.rstrip()
-            if dtype=='header':console.print(f"[dim]{line_content}[/dim]")
-            elif dtype=='add':console.print(f"[green]{line_content}[/green]")
-            elif dtype=='remove':console.print(f"[red]{line_content}[/red]")
-            else:console.print(f"[dim]{line_content}[/dim]")
-        if len(diff_lines)>20:console.print(f"[dim]...{len(diff_lines)-20} more lines[/dim]")
+    additions=removals=total=0;shown=[]
+    for line in diff_lines(old,new):
+        tag=line[:1];total+=1
+        if tag=='+':additions+=1
+        elif tag=='-':removals+=1
+        if total<=20:shown.append(Text(line.rstrip(),style=DIFF_STYLES.get(tag,"dim")))
+    if total:
+        console.print(f"[dim]⎿Updated {filename} with {additions} additions and {removals} removals[/dim]")
+        console.print(Text("\n").join(shown))
+        if total>20:console.print(f"[dim]...{total-20} more lines[/dim]")
+
+@functools.lru_cache(maxsize=64)
+def lexer_for(name:str):
+    try:return get_lexer_by_name(name or"text")
+    except ClassNotFound:return TextLexer()
+
+@functools.lru_cache(maxsize=64)
+def glob_matcher(pattern:str)->Callable:
+    return re.compile(fnmatch.translate(pattern),re.IGNORECASE if os.path.normcase('A')=='a'else 0).match
+
+def glob_parts_match(parts:tuple,names:list)->bool:
+    if not parts:return not names
+    if parts[0]is None:return any(glob_parts_match(parts[1:],names[i:])for i in range(len(names)+1))
+    return bool(names)and bool(parts[0](names[0]))and glob_parts_match(parts[1:],names[1:])
+
+def new_session()->requests.Session:
+    session=requests.Session()
+    session.headers['Content-Type']='application/json'
+    session.mount('http://',requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=4))
+    return session
+
+def kill_process_tree(proc):
+    try:
+        if os.name=='posix':os.killpg(proc.pid,signal.SIGKILL)
+        else:proc.kill()
+    except OSError:pass
+
+def read_tail(stream,cap:int,echo:Optional[Callable]=None)->str:
+    tail,chars,dropped=collections.deque(),0,False
+    for line in iter(functools.partial(stream.readline,1<<16),''):
+        if echo:echo(line)
+        tail.append(line);chars+=len(line)
+        while chars>cap:chars-=len(tail.popleft());dropped=True
+    return("...earlier output truncated...\n"if dropped else"")+"".join(tail)
+
+def command_argv(command:str)->Optional[List[str]]:
+    if os.name!='posix'or SHELL_META_RE.search(command):return None
+    try:return shlex.split(command)or None
+    except ValueError:return None
+
+def iter_ndjson(response):
+    buffer=b""
+    for data in response.iter_content(chunk_size=None):
+        *lines,buffer=(buffer+data if buffer else data).split(b'\n')
+        for line in lines:
+            if line:yield json_loads(line)
+    if buffer.strip():yield json_loads(buffer)
+
+def iter_tree(root,skip_dir:Optional[Callable]=None):
+    skip_dir=skip_dir or DEFAULT_IGNORED_DIRS.__contains__
+    stack=[os.fspath(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop())as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if not skip_dir(entry.name):stack.append(entry.path)
+                    else:yield entry
+        except OSError:continue
+
+def scan_dirs(paths:List[str],match_name:Callable,limit:int=50,skip_dir:Optional[Callable]=None)->tuple:
+    skip_dir=skip_dir or DEFAULT_IGNORED_DIRS.__contains__
+    found,subdirs=[],[]
+    for path in paths:
+        try:
+            with os.scandir(path)as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):continue
+                    is_dir=entry.is_dir(follow_symlinks=False)
+                    if match_name(entry.name):
+                        found.append((Path(entry.path),is_dir))
+                        if len(found)>=limit:return found,subdirs
+                    if is_dir and not skip_dir(entry.name):subdirs.append(entry.path)
+        except OSError:pass
+    return found,subdirs
+
+def read_fd(fd:int,size:int)->bytes:
+    data=os.read(fd,size+1)
+    return data+b"".join(iter(functools.partial(os.read,fd,1<<16),b""))if len(data)>size else data
+
+def read_path(path)->bytes:
+    fd=os.open(path,READ_FLAGS)
+    try:return read_fd(fd,os.fstat(fd).st_size)
+    finally:os.close(fd)
+
+def preview_large_file(fd:int,size:int)->tuple:
+    with mmap.mmap(fd,0,access=mmap.ACCESS_READ)as mm:
+        end=size-(mm[-1:]==b'\n')
+        num_lines=sum(mm[i:min(i+(1<<20),end)].count(b'\n')for i in range(0,end,1<<20))+1
+        if num_lines<=100:return num_lines,mm[:200_000].decode('utf-8','replace')
+        head=tail=-1
+        for _ in range(50):head=mm.find(b'\n',head+1)
+        tail=end
+        for _ in range(50):tail=mm.rfind(b'\n',0,tail)
+        return num_lines,f"{mm[:head].decode('utf-8','replace')}\n...{num_lines-100} lines omitted...\n{mm[tail+1:end].decode('utf-8','replace')}"
+
+class StreamRenderer:
+    def __init__(self):self.blocks,self.done_upto=[],0
+    def render(self,text:str):
+        while(fence:=text.find("```",self.done_upto))>=0:
+            header_end=text.find("\n",fence)
+            if header_end<0:break
+            close=text.find("\n```",header_end)
+            if close<0:break
+            if text[self.done_upto:fence].strip():self.blocks.append(Markdown(text[self.done_upto:fence]))
+            self.blocks.append(Syntax(text[header_end+1:close],lexer_for(text[fence+3:header_end].strip()),theme="monokai"))
+            self.done_upto=close+4
+        if(para:=text.rfind("\n\n",self.done_upto,fence if fence>=0 else len(text)))>self.done_upto:
+            if text[self.done_upto:para].strip():self.blocks.append(Markdown(text[self.done_upto:para]))
+            self.done_upto=para+2
+        return Group(*self.blocks,Text(text[self.done_upto:]))
 
 class Todo:
+    __slots__=('content','status','active_form')
     def __init__(self,content:str,status:str="pending",active_form:str=""):
         self.content,self.status,self.active_form=content,status,active_form or f"Working on: {content}"
     def to_dict(self):return{"content":self.content,"status":self.status,"activeForm":self.active_form}
 
 class TodoList:
+    STATUS_LABELS={"pending":"⏸️ Pending","in_progress":"[yellow]▶️ In Progress[/yellow]","completed":"[green]✅ Completed[/green]"}
+    STATUS_ICONS={"pending":"⏸️","in_progress":"▶️","completed":"✅"}
     def __init__(self):self.todos:List[Todo]=[]
     def add(self,content:str,status:str="pending",active_form:str=""):self.todos.append(Todo(content,status,active_form))
     def update(self,index:int,status:str=None,content:str=None):
         if 0<=index<len(self.todos):
             if status:self.todos[index].status=status
             if content:self.todos[index].content=content
-    def get_current(self)->Optional[Todo]:
-        for todo in self.todos:
-            if todo.status=="in_progress":return todo
-        return None
+    def get_current(self)->Optional[Todo]:return next((todo for todo in self.todos if todo.status=="in_progress"),None)
     def mark_complete(self,index:int):self.update(index,status="completed")
     def display(self):
         if not self.todos:console.print("[dim]No todos[/dim]");return
@@ -78,43 +268,75 @@ class TodoList:
         table.add_column("#",style="dim",width=3)
         table.add_column("Status",width=12)
         table.add_column("Task",style="cyan")
-        status_icons={"pending":"⏸️ Pending","in_progress":"▶️ In Progress","completed":"✅ Completed"}
-        for i,todo in enumerate(self.todos):
-            status_display=status_icons.get(todo.status,todo.status)
-            if todo.status=="in_progress":status_display=f"[yellow]{status_display}[/yellow]"
-            elif todo.status=="completed":status_display=f"[green]{status_display}[/green]"
-            table.add_row(str(i+1),status_display,todo.content)
+        for i,todo in enumerate(self.todos,1):table.add_row(str(i),self.STATUS_LABELS.get(todo.status,todo.status),todo.content)
         console.print(table)
     def get_summary(self)->str:
         if not self.todos:return "No todos"
-        lines=[]
-        for i,todo in enumerate(self.todos):
-            status_icon={"pending":"⏸️","in_progress":"▶️","completed":"✅"}[todo.status]
-            lines.append(f"{i+1}.[{todo.status}]{status_icon}{todo.content}")
-        return"\n".join(lines)
+        return"\n".join(f"{i}.[{todo.status}]{self.STATUS_ICONS[todo.status]}{todo.content}"for i,todo in enumerate(self.todos,1))
+
+def payload_key(body:bytes)->str:return hashlib.blake2b(body,digest_size=32).hexdigest()
+
+class ResponseCache:
+    def __init__(self,cache_dir:Path,max_bytes:int):self.cache_dir,self.max_bytes=cache_dir,max_bytes
+    def _path(self,key:str)->Path:return self.cache_dir/key[:2]/key[2:]
+    def get(self,key:str)->Optional[str]:
+        try:
+            with gzip.open(self._path(key),'rb')as f:value=f.read().decode()
+        except OSError:return None
+        # Entries written before tool replies were excluded would re-run their tool calls in a changed tree
+        return None if'TOOL['in value else value
+    def put(self,key:str,value:str):
+        if'TOOL['in value:return
+        try:
+            path=self._path(key);path.parent.mkdir(parents=True,exist_ok=True)
+            tmp=path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with gzip.open(tmp,'wb')as f:f.write(value.encode())
+            os.replace(tmp,path);self._evict()
+        except OSError as e:console.print(f"[dim]Response cache not written: {e}[/dim]")
+    def _evict(self):
+        entries=sorted(((p.stat(),p)for p in self.cache_dir.glob('*/*')if not p.name.endswith('.tmp')),key=lambda e:e[0].st_mtime)
+        total=sum(st.st_size for st,_ in entries)
+        for st,p in entries:
+            if total<=self.max_bytes:break
+            p.unlink(missing_ok=True);total-=st.st_size
 
 class Tool:
     def __init__(self,name:str,description:str,func:Callable):self.name,self.description,self.func=name,description,func
     def execute(self,*args,**kwargs):return self.func(*args,**kwargs)
 
 class EnhancedCodeAgent:
-    def __init__(self,model:str="llama3.2",base_url:str="http://localhost:11434"):
+    def __init__(self,model:str="llama3.2",base_url:str="http://localhost:11434",session:Optional[requests.Session]=None):
         self.model,self.base_url=model,base_url
-        self.conversation_history:List[Dict]=[]
+        self.session=session or new_session()
+        self.conversation_history:collections.deque=collections.deque(maxlen=12)
+        self._context_parts:collections.deque=collections.deque(maxlen=12)
+        self._mention_cache:Dict[tuple,str]={}
         self.working_directory=Path.cwd()
         self.tools=self._register_tools()
-        self.session_start=datetime.now()
+        self._static_prompt=self._build_static_prompt()
+        self.session_start,self._session_start_monotonic=datetime.now(),time.monotonic()
         self.todo_list=TodoList()
         self.iterative_mode=False
         self.project_context=""
+        self._prompt_version,self._prompt_cache=0,(None,"")
         self.token_tracker=TokenTracker()
         self.thinking_time=0
+        caching=config_value("ENABLE_CACHING",False)
+        self.response_cache=ResponseCache(Path(config_value("CACHE_DIR",".agent_cache")).resolve(),config_value("MAX_CACHE_BYTES",100<<20))if caching else None
+        self.use_cache=caching
+        self._response_memo:collections.OrderedDict=collections.OrderedDict()
+        self.semantic_model,self.semantic_threshold=(config_value("SEMANTIC_CACHE_MODEL",""),config_value("SEMANTIC_CACHE_THRESHOLD",0.92))if caching else("",1.0)
+        self._semantic_entries:collections.defaultdict=collections.defaultdict(lambda:collections.deque(maxlen=64))
+        self.replayed=False
+        self._prefetch_pool:Optional[ThreadPoolExecutor]=None
+        self._prefetched:Dict[tuple,object]={};self._prefetch_pos=-1
+        self._payload_prefix:Dict[str,bytes]={}
 
     def _register_tools(self)->Dict[str,Tool]:
         tools={}
         tools['read_file']=Tool('read_file','Read file. Usage: read_file(filepath)',self._read_file)
         tools['write_file']=Tool('write_file','Write file. Usage: write_file(filepath,content)',self._write_file)
-        tools['edit_file']=Tool('edit_file','Edit file. Usage: edit_file(filepath,old_text,new_text)',self._edit_file)
+        tools['edit_file']=Tool('edit_file','Edit file (replaces first match). Usage: edit_file(filepath,old_text,new_text)',self._edit_file)
         tools['run_command']=Tool('run_command','Run command. Usage: run_command(command)',self._run_command)
         tools['validate_python']=Tool('validate_python','Validate Python syntax. Usage: validate_python(filepath)',self._validate_python)
         tools['list_files']=Tool('list_files','List files. Usage: list_files() or list_files(directory)',lambda*args:self._list_files(args[0]if args and args[0]else"."))
@@ -125,59 +347,94 @@ class EnhancedCodeAgent:
         tools['show_todos']=Tool('show_todos','Show todos. Usage: show_todos()',lambda*args:self._show_todos())
         return tools
 
+    def _resolve(self,filepath:str)->Path:return self.working_directory/filepath
+
     def _read_file(self,filepath:str)->str:
         try:
-            path=Path(filepath)if Path(filepath).is_absolute()else self.working_directory/filepath
-            if not path.exists():return f"Error: File not found: {filepath}"
-            content=path.read_text()
-            num_lines=len(content.splitlines())
+            path=self._resolve(filepath)
+            try:fd=os.open(path,READ_FLAGS)
+            except FileNotFoundError:return f"Error: File not found: {filepath}"
+            try:
+                if(size:=os.fstat(fd).st_size)>200_000:
+                    num_lines,display_content=preview_large_file(fd,size)
+                    show_checkpoint(f"Read({path.name})",f"Read {num_lines} lines")
+                    console.print(Panel(Text(display_content),title=f"📄{path.name}",border_style="blue"))
+                    return f"Successfully read {size} bytes from {filepath}"
+                content=read_fd(fd,size).decode('utf-8','replace')
+            finally:os.close(fd)
+            num_lines,end=content.count('\n')+bool(content)-content.endswith('\n'),-1
             show_checkpoint(f"Read({path.name})",f"Read {num_lines} lines")
-            display_content='\n'.join(content.splitlines()[:100])
+            for _ in range(100):
+                if(end:=content.find('\n',end+1))<0:break
+            display_content=content[:end]if num_lines>100 else content.removesuffix('\n')
             if num_lines>100:display_content+=f"\n...{num_lines-100} more lines"
-            console.print(Panel(Syntax(display_content,path.suffix[1:]or"text",theme="monokai",line_numbers=True),title=f"📄{path.name}",border_style="blue"))
+            lexer=lexer_for(path.suffix[1:])
+            body=Text(display_content)if isinstance(lexer,TextLexer)or LONG_LINE_RE.search(display_content)else Syntax(display_content,lexer,theme="monokai",line_numbers=True)
+            console.print(Panel(body,title=f"📄{path.name}",border_style="blue"))
             return f"Successfully read {len(content)} characters from {filepath}"
         except Exception as e:return f"Error reading file: {str(e)}"
 
     def _write_file(self,filepath:str,content:str)->str:
         try:
-            path=Path(filepath)if Path(filepath).is_absolute()else self.working_directory/filepath
-            file_exists,old_content=path.exists(),path.read_text()if path.exists()else ""
+            path=self._resolve(filepath)
+            try:file_exists,old_raw=True,read_path(path)if path.stat().st_size<=DIFF_MAX_BYTES else None
+            except FileNotFoundError:file_exists,old_raw=False,None
+            processed_content=ESCAPE_RE.sub(lambda m:ESCAPES[m[1]],content)if'\\'in content else content
+            if old_raw is not None and old_raw==processed_content.encode('utf-8'):show_checkpoint(f"Update({path.name})","No changes");return f"Successfully wrote to {filepath} (content unchanged)"
             path.parent.mkdir(parents=True,exist_ok=True)
-            try:processed_content=content.encode('utf-8').decode('unicode_escape')
-            except:processed_content=content.replace('\\n','\n').replace('\\t','\t').replace('\\r','\r')
-            path.write_text(processed_content)
-            if file_exists:show_checkpoint(f"Update({path.name})");show_diff(old_content,processed_content,path.name)
+            with path.open('w',encoding='utf-8',newline='',buffering=WRITE_CHUNK_CHARS)as f:
+                for i in range(0,len(processed_content),WRITE_CHUNK_CHARS):f.write(processed_content[i:i+WRITE_CHUNK_CHARS])
+            if old_raw is not None:show_checkpoint(f"Update({path.name})");show_diff(old_raw.decode('utf-8','replace'),processed_content,path.name)
+            elif file_exists:show_checkpoint(f"Update({path.name})","Replaced large file, diff skipped")
             else:num_lines=len(processed_content.splitlines());show_checkpoint(f"Write({path.name})",f"Created with {num_lines} lines")
             return f"Successfully wrote to {filepath}"
         except Exception as e:return f"Error writing file: {str(e)}"
 
     def _edit_file(self,filepath:str,old_text:str,new_text:str)->str:
         try:
-            path=Path(filepath)if Path(filepath).is_absolute()else self.working_directory/filepath
-            if not path.exists():return f"Error: File not found: {filepath}"
-            old_content=path.read_text()
-            if old_text not in old_content:return f"Error: Text to replace not found in file"
-            new_content=old_content.replace(old_text,new_text)
-            path.write_text(new_content)
+            path=self._resolve(filepath)
+            try:raw=read_path(path)
+            except FileNotFoundError:return f"Error: File not found: {filepath}"
+            old_bytes,new_bytes=old_text.encode('utf-8'),new_text.encode('utf-8')
+            if b'\r\n'in raw and b'\r\n'not in old_bytes:old_bytes,new_bytes=old_bytes.replace(b'\n',b'\r\n'),new_bytes.replace(b'\r\n',b'\n').replace(b'\n',b'\r\n')
+            if not old_bytes or(idx:=raw.find(old_bytes))<0:return f"Error: Text to replace not found in file"
+            end=idx+len(old_bytes);new_raw=raw[:idx]+new_bytes+raw[end:]
+            target=path.resolve();tmp=target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(new_raw);os.chmod(tmp,target.stat().st_mode&0o7777);os.replace(tmp,target)
             show_checkpoint(f"Update({path.name})")
-            show_diff(old_content,new_content,path.name)
+            show_diff(raw.decode('utf-8','replace'),new_raw.decode('utf-8','replace'),path.name)
+            if raw.find(old_bytes,end)>=0:return f"Successfully edited {filepath} (replaced the first occurrence only; the text appears again later in the file)"
             return f"Successfully edited {filepath}"
         except Exception as e:return f"Error editing file: {str(e)}"
 
     def _run_command(self,command:str)->str:
         try:
             console.print(f"[yellow]${command}[/yellow]")
-            result=subprocess.run(command,shell=True,capture_output=True,text=True,cwd=self.working_directory,timeout=30)
-            output=result.stdout
-            if result.stderr:output+=f"\n[stderr]\n{result.stderr}"
-            if output:console.print(output)
-            return f"Command executed. Exit code: {result.returncode}\n{output}"
-        except subprocess.TimeoutExpired:return "Error: Command timed out after 30 seconds"
+            popen=functools.partial(subprocess.Popen,stdout=subprocess.PIPE,stderr=subprocess.PIPE,text=True,errors='replace',bufsize=1,cwd=self.working_directory,start_new_session=os.name=='posix')
+            try:proc=popen(argv)if(argv:=command_argv(command))else popen(command,shell=True)
+            except FileNotFoundError:proc=popen(command,shell=True)
+            timed_out=threading.Event()
+            def on_timeout():timed_out.set();kill_process_tree(proc)
+            timer=threading.Timer(30,on_timeout);timer.start()
+            shown=0
+            def echo(line):
+                nonlocal shown
+                if shown<COMMAND_OUTPUT_CAP:
+                    console.print(line,end='',markup=False,highlight=False)
+                    if(shown:=shown+len(line))>=COMMAND_OUTPUT_CAP:console.print("\n[dim]...further output hidden[/dim]")
+            # stderr drains on its own thread so neither pipe can fill up and block the command
+            stderr=[""];reader=threading.Thread(target=lambda:stderr.__setitem__(0,read_tail(proc.stderr,COMMAND_OUTPUT_CAP)),daemon=True);reader.start()
+            try:output=read_tail(proc.stdout,COMMAND_OUTPUT_CAP,echo);returncode=proc.wait();reader.join(5)
+            except BaseException:kill_process_tree(proc);raise
+            finally:timer.cancel();proc.stdout.close()
+            if stderr[0]:console.print(f"[stderr]\n{stderr[0]}",end='',markup=False,highlight=False);output+=f"\n[stderr]\n{stderr[0]}"
+            if timed_out.is_set():return f"Error: Command timed out after 30 seconds\n{output}"
+            return f"Command executed. Exit code: {returncode}\n{output}"
         except Exception as e:return f"Error executing command: {str(e)}"
 
     def _validate_python(self,filepath:str)->str:
         try:
-            path=Path(filepath)if Path(filepath).is_absolute()else self.working_directory/filepath
+            path=self._resolve(filepath)
             if not path.exists():return f"Error: File not found: {filepath}"
             code=path.read_text()
             try:
@@ -193,17 +450,17 @@ class EnhancedCodeAgent:
 
     def _list_files(self,directory:str=".")->str:
         try:
-            path=Path(directory)if Path(directory).is_absolute()else self.working_directory/directory
-            if not path.exists()or not path.is_dir():return f"Error: Directory not found: {directory}"
+            path=self.working_directory/directory
+            if not path.is_dir():return f"Error: Directory not found: {directory}"
             tree=Tree(f"📁{path.name}/",guide_style="blue")
             def add_to_tree(parent,current_path,level=0):
                 if level>2:return
                 try:
-                    items=sorted(current_path.iterdir(),key=lambda x:(not x.is_dir(),x.name))
-                    for item in items[:50]:
-                        if item.name.startswith('.'):continue
-                        if item.is_dir():branch=parent.add(f"📁{item.name}/");add_to_tree(branch,item,level+1)
-                        else:size=item.stat().st_size;size_str=self._format_size(size);parent.add(f"📄{item.name}[dim]({size_str})[/dim]")
+                    with os.scandir(current_path)as entries:items=[(entry.is_dir(follow_symlinks=False),entry)for entry in entries if not entry.name.startswith('.')]
+                    for is_dir,entry in heapq.nsmallest(50,items,key=lambda x:(not x[0],x[1].name)):
+                        if is_dir:branch=parent.add(f"📁{entry.name}/");add_to_tree(branch,entry.path,level+1)
+                        elif level==0:size_str=self._format_size(entry.stat(follow_symlinks=False).st_size);parent.add(f"📄{entry.name}[dim]({size_str})[/dim]")
+                        else:parent.add(f"📄{entry.name}")
                 except PermissionError:parent.add("[red]Permission denied[/red]")
             add_to_tree(tree,path)
             console.print(tree)
@@ -212,35 +469,43 @@ class EnhancedCodeAgent:
 
     def _search_files(self,pattern:str)->str:
         try:
-            matches=list(self.working_directory.rglob(f"*{pattern}*"))
-            matches=[m for m in matches if not any(part.startswith('.')for part in m.parts)]
+            match_name=re.compile(fnmatch.translate(f"*{pattern}*")).match if any(c in pattern for c in'*?[')else lambda name:pattern in name
+            matches,frontier=[],[os.fspath(self.working_directory)]
+            skip_dir=config_value("is_ignored_dir");pool=None
+            try:
+                while frontier and len(matches)<50:
+                    next_frontier=[]
+                    # Most levels are narrow; the pool only starts once a level is wide enough to pay for it
+                    if len(frontier)>=64:
+                        pool=pool or ThreadPoolExecutor(max_workers=8)
+                        results=pool.map(scan_dirs,[frontier[i::8]for i in range(8)],itertools.repeat(match_name),itertools.repeat(50-len(matches)),itertools.repeat(skip_dir))
+                    else:results=[scan_dirs(frontier,match_name,50-len(matches),skip_dir)]
+                    for found,subdirs in results:matches.extend(found);next_frontier.extend(subdirs)
+                    frontier=next_frontier
+            finally:
+                if pool:pool.shutdown()
             matches=matches[:50]
             if not matches:console.print(f"[yellow]No matches found for: {pattern}[/yellow]");return "No matches found"
             console.print(f"\n[green]Found {len(matches)} matches:[/green]")
-            for match in matches:
-                rel_path=match.relative_to(self.working_directory)
-                icon="📁"if match.is_dir()else"📄"
-                console.print(f"{icon}{rel_path}")
+            console.print(Text("\n").join(Text(f"{'📁'if is_dir else'📄'}{match.relative_to(self.working_directory)}")for match,is_dir in matches))
             return f"Found {len(matches)} matches for '{pattern}'"
         except Exception as e:return f"Error searching: {str(e)}"
 
     def _create_directory(self,path:str)->str:
         try:
-            dir_path=Path(path)if Path(path).is_absolute()else self.working_directory/path
+            dir_path=self._resolve(path)
             dir_path.mkdir(parents=True,exist_ok=True)
             console.print(f"[green]✓Created directory: {dir_path}[/green]")
             return f"Successfully created {path}"
         except Exception as e:return f"Error creating directory: {str(e)}"
 
     def _format_size(self,size:int)->str:
-        for unit in['B','KB','MB','GB']:
-            if size<1024:return f"{size:.1f}{unit}"
-            size/=1024
-        return f"{size:.1f}TB"
+        i=min(max(size.bit_length()-1,0)//10,4)
+        return f"{size/(1<<(i*10)):.1f}{SIZE_UNITS[i]}"
 
     def _add_todo(self,task:str)->str:
         try:
-            self.todo_list.add(task,status="pending",active_form=f"Working on: {task}")
+            self.todo_list.add(task,status="pending",active_form=f"Working on: {task}");self._prompt_version+=1
             console.print(f"[green]✓Added todo: {task}[/green]")
             return f"Added task: {task}"
         except Exception as e:return f"Error adding todo: {str(e)}"
@@ -249,7 +514,7 @@ class EnhancedCodeAgent:
         try:
             index=int(task_number)-1
             if status not in["pending","in_progress","completed"]:return f"Error: Invalid status. Use pending, in_progress, or completed"
-            self.todo_list.update(index,status=status)
+            self.todo_list.update(index,status=status);self._prompt_version+=1
             console.print(f"[green]✓Updated task {task_number} to {status}[/green]")
             return f"Updated task {task_number} to {status}"
         except Exception as e:return f"Error updating todo: {str(e)}"
@@ -260,39 +525,38 @@ class EnhancedCodeAgent:
 
     def init_project(self)->str:
         console.print("\n[cyan]🔍Analyzing codebase...[/cyan]\n")
-        analysis=[]
-        readme_files=['README.md','README.txt','README']
-        for readme in readme_files:
-            readme_path=self.working_directory/readme
-            if readme_path.exists():
-                try:content=readme_path.read_text()[:2000];analysis.append(f"## README Summary\n{content[:500]}...");break
+        analysis,entries,structure_error=[],{},None
+        try:
+            with os.scandir(self.working_directory)as it:entries={entry.name:entry.is_dir()for entry in it}
+        except OSError as e:structure_error=e
+        for readme in README_FILES:
+            if entries.get(readme)is False:
+                try:
+                    with open(self.working_directory/readme)as f:analysis.append(f"## README Summary\n{f.read(500)}...");break
                 except:pass
         analysis.append("\n## Project Structure")
-        try:
-            items=sorted(self.working_directory.iterdir(),key=lambda x:(not x.is_dir(),x.name))
-            structure_lines=[]
-            for item in items[:20]:
-                if item.name.startswith('.'):continue
-                icon="📁"if item.is_dir()else"📄"
-                structure_lines.append(f"{icon}{item.name}")
-            analysis.append("\n".join(structure_lines))
-        except Exception as e:analysis.append(f"Error reading structure: {e}")
+        if structure_error:analysis.append(f"Error reading structure: {structure_error}")
+        else:analysis.append("\n".join(f"{'📄'if is_file else'📁'}{name}"for is_file,name in heapq.nsmallest(20,((not is_dir,name)for name,is_dir in entries.items()if not name.startswith('.')))))
         analysis.append("\n## Detected Technologies")
-        tech_indicators={'package.json':'Node.js/JavaScript','requirements.txt':'Python','Cargo.toml':'Rust','go.mod':'Go','pom.xml':'Java (Maven)','build.gradle':'Java (Gradle)','Gemfile':'Ruby'}
-        found_tech=[]
-        for file,tech in tech_indicators.items():
-            if(self.working_directory/file).exists():found_tech.append(f"•{tech}")
+        found_tech=[f"•{tech}"for file,tech in TECH_INDICATORS.items()if file in entries]
         if found_tech:analysis.append("\n".join(found_tech))
         else:analysis.append("•No common project files detected")
-        self.project_context="\n".join(analysis)
+        self.project_context="\n".join(analysis);self._prompt_version+=1
         console.print(Panel(Markdown(self.project_context),title="📋Project Analysis",border_style="cyan"))
         return "Project initialized and analyzed"
 
-    def _build_system_prompt(self)->str:
-        tools_desc="\n".join([f"-{name}:{tool.description}"for name,tool in self.tools.items()])
+    def _build_session_context(self)->str:
+        key=(self._prompt_version,self.working_directory,datetime.now().strftime('%Y-%m-%d'))
+        if self._prompt_cache[0]==key:return self._prompt_cache[1]
         context_section=f"\n## Project Context\n{self.project_context}\n"if self.project_context else""
         todo_section=f"\n## Current Tasks\n{self.todo_list.get_summary()}\n"if self.todo_list.todos else""
-        return f"""You are an expert AI coding assistant running locally. You help with coding, debugging, and file operations.
+        prompt=f"Current directory: {key[1]}\nCurrent date: {key[2]}\n{context_section}{todo_section}"
+        self._prompt_cache=(key,prompt)
+        return prompt
+
+    def _build_static_prompt(self)->str:
+        tools_desc="\n".join([f"-{name}:{tool.description}"for name,tool in self.tools.items()])
+        head=f"""You are an expert AI coding assistant running locally. You help with coding, debugging, and file operations.
 
 You have access to these tools:
 {tools_desc}
@@ -343,11 +607,8 @@ TOOL[read_file](script.py)
 TOOL[edit_file](script.py, "print(Hello world)", "print(\\"Hello world\\")")
 TOOL[run_command](python3 script.py)
 
-Current directory: {self.working_directory}
-Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-{context_section}{todo_section}
-
-Guidelines:
+"""
+        tail="""Guidelines:
 1. Always explain what you're doing before using tools
 2. For file operations, show the relevant code/content
 3. Ask for confirmation before destructive operations
@@ -374,157 +635,287 @@ User asks: "Create a REST API with authentication"
 
 Always think step-by-step and use the todo list for multi-step tasks!
 """
-
-    def _extract_tool_calls(self,text:str)->List[Dict]:
-        tool_calls=[]
-        pattern=r'TOOL\[(\w+)\]'
-        for match in re.finditer(pattern,text):
-            tool_name=match.group(1)
+        return head+tail
+
+    def _scan_tool_calls(self,text:str)->tuple:
+        if'TOOL['not in text:return[],text
+        tool_calls,kept,pos=[],[],0
+        while match:=TOOL_NAME_RE.search(text,pos):
+            if call:=TOOL_CALL_RE.match(text,match.start()):
+                tool_calls.append({'tool':match.group(1),'args':call.group(2).strip()});kept.append(text[pos:match.start()]);pos=call.end();continue
             start_pos=match.end()
-            if start_pos<len(text)and text[start_pos]=='(':
-                paren_count,in_quotes,quote_char,end_pos=0,False,None,start_pos
-                for i in range(start_pos,len(text)):
-                    char=text[i]
-                    if char in['"',"'"]and(i==0 or text[i-1]!='\\'):
-                        if not in_quotes:in_quotes,quote_char=True,char
-                        elif char==quote_char:in_quotes,quote_char=False,None
-                    if not in_quotes:
-                        if char=='(':paren_count+=1
-                        elif char==')':
-                            paren_count-=1
-                            if paren_count==0:end_pos=i;break
-                if end_pos>start_pos:
-                    args_str=text[start_pos+1:end_pos]
-                    tool_calls.append({'tool':tool_name,'args':args_str.strip()})
-        return tool_calls
-
-    def _parse_args(self,args_str:str)->tuple:
-        args,current_arg,in_quotes,quote_char,paren_depth,i=[],"",False,None,0,0
-        while i<len(args_str):
-            char=args_str[i]
-            if char=='\\'and i+1<len(args_str)and in_quotes:
-                current_arg+=char;i+=1
-                if i<len(args_str):current_arg+=args_str[i]
-                i+=1;continue
-            if char in['"',"'"]and paren_depth==0:
+            end_pos=self._find_call_end(text,start_pos)if start_pos<len(text)and text[start_pos]=='('else start_pos
+            if end_pos>start_pos:tool_calls.append({'tool':match.group(1),'args':text[start_pos+1:end_pos].strip()});kept.append(text[pos:match.start()]);pos=end_pos+1
+            else:kept.append(text[pos:match.end()]);pos=match.end()
+        kept.append(text[pos:])
+        return tool_calls,"".join(kept)
+
+    def _find_call_end(self,text:str,start_pos:int)->int:
+        paren_count,in_quotes,quote_char=0,False,None
+        for match in CALL_DELIM_RE.finditer(text,start_pos):
+            i,char=match.start(),match.group()
+            if char in'"\''and(i==0 or text[i-1]!='\\'):
                 if not in_quotes:in_quotes,quote_char=True,char
                 elif char==quote_char:in_quotes,quote_char=False,None
-                else:current_arg+=char
-                i+=1;continue
             if not in_quotes:
-                if char=='(':paren_depth+=1
-                elif char==')':paren_depth-=1
-            if char==','and not in_quotes and paren_depth==0:args.append(current_arg.strip());current_arg=""
-            else:current_arg+=char
-            i+=1
-        if current_arg.strip():args.append(current_arg.strip())
+                if char=='(':paren_count+=1
+                elif char==')':
+                    paren_count-=1
+                    if paren_count==0:return i
+        return start_pos
+
+    def _extract_tool_calls(self,text:str)->List[Dict]:return self._scan_tool_calls(text)[0]
+
+    def _parse_args(self,args_str:str)->tuple:
+        if not CALL_DELIM_RE.search(args_str):
+            args=[arg.strip()for arg in args_str.split(',')]
+            return tuple(args if args[-1]else args[:-1])
+        args,parts,paren_depth,pos,n=[],[],0,0,len(args_str)
+        while pos<n:
+            if paren_depth:
+                match=PAREN_RE.search(args_str,pos)
+                if not match:parts.append(args_str[pos:]);break
+                parts.append(args_str[pos:match.end()]);paren_depth+=1 if match.group()=='('else -1;pos=match.end();continue
+            match=ARG_TOKEN_RE.match(args_str,pos);token=match.group();pos=match.end()
+            if token==',':args.append("".join(parts).strip());parts=[]
+            elif token=='(':parts.append(token);paren_depth=1
+            elif token==')':parts.append(token);paren_depth=-1
+            elif match.group(1)is not None:parts.append(match.group(1))
+            elif match.group(2)is not None:parts.append(match.group(2))
+            else:parts.append(token)
+        if(last:="".join(parts).strip()):args.append(last)
         return tuple(args)
 
+    def _model_params(self)->Dict:
+        cfg=model_config(self.model)
+        if not cfg:return{"options":{"temperature":0.7,"num_predict":2048}}
+        return{"options":{"temperature":cfg.temperature,"num_predict":cfg.num_predict,"top_k":cfg.top_k,"top_p":cfg.top_p,"num_ctx":cfg.context_window,"num_batch":cfg.num_batch},"keep_alive":cfg.keep_alive}
+
+    def _request_body(self,prompt:str)->bytes:
+        if(prefix:=self._payload_prefix.get(self.model))is None:
+            prefix=self._payload_prefix[self.model]=json_dumps({"model":self.model,"stream":True,**self._model_params()})[:-1]+b',"prompt":'
+        return prefix+json_dumps(prompt)+b'}'
+
+    def preload_model(self):
+        try:
+            with console.status(f"[dim]Loading {self.model}...[/dim]"):self.session.post(f"{self.base_url}/api/generate",json={"model":self.model,**self._model_params()},timeout=120)
+        except Exception as e:console.print(f"[yellow]⚠️Could not preload {self.model}: {e}[/yellow]")
+
+    def _cached_response(self,key:str)->Optional[str]:
+        if key in self._response_memo:self._response_memo.move_to_end(key);return self._response_memo[key]
+        cached=self.response_cache.get(key)if self.response_cache else None
+        if cached is not None:self._response_memo[key]=cached
+        return cached
+
+    def _store_response(self,key:str,response:str):
+        # Replies with tool calls would re-run stale writes and commands when replayed
+        if'TOOL['in response:return
+        self._response_memo[key]=response
+        if len(self._response_memo)>64:self._response_memo.popitem(last=False)
+        if self.response_cache:self.response_cache.put(key,response)
+
+    def _embed(self,text:str)->Optional[tuple]:
+        try:
+            response=self.session.post(f"{self.base_url}/api/embeddings",data=json_dumps({"model":self.semantic_model,"prompt":text}),timeout=30)
+            response.raise_for_status();vector=json_loads(response.content)["embedding"]
+        except Exception:return None
+        norm=math.sqrt(sum(map(operator.mul,vector,vector)))
+        return(vector,norm)if norm else None
+
+    def _semantic_lookup(self,bucket:str,embedding:tuple)->Optional[str]:
+        vector,norm=embedding;best,best_score=None,self.semantic_threshold
+        for other,other_norm,response in self._semantic_entries[bucket]:
+            if(score:=sum(map(operator.mul,vector,other))/(norm*other_norm))>=best_score:best,best_score=response,score
+        return best
+
     def call_ollama(self,prompt:str)->str:
         url=f"{self.base_url}/api/generate"
-        context=self._build_system_prompt()+"\n\n"
-        for msg in self.conversation_history[-6:]:context+=f"{msg['role']}:{msg['content']}\n\n"
-        context+=f"user:{prompt}\n\nassistant:"
-        payload={"model":self.model,"prompt":context,"stream":True,"options":{"temperature":0.7,"num_predict":2048}}
+        session_context=self._build_session_context()
+        # Byte-stable text first so Ollama's prefix cache survives todo and project changes; nothing turn-dependent goes before the history
+        head=f"{self._static_prompt}\n\n{self._history_context((len(self._static_prompt)+len(session_context))//4)}{session_context}\n"
+        context=f"{head}user:{prompt}\n\nassistant:"
+        body=self._request_body(context)
+        cache_key=payload_key(body)if self.use_cache else None
+        self.replayed=False
+        if cache_key and(cached:=self._cached_response(cache_key))is not None:console.print(Markdown(cached));console.print("\n[dim]∴Cached response[/dim]");self.replayed=True;return cached
+        bucket=embedding=None
+        if self.use_cache and self.semantic_model:
+            # Bucket on everything but the in-flight turn, which chat() has already appended to the history
+            parts=self._context_parts;prior=itertools.islice(parts,len(parts)-1)if parts and parts[-1]==f"user:{prompt}\n\n"else parts
+            bucket=payload_key(self._request_body(f"{self._static_prompt}\n\n{''.join(prior)}{session_context}"))
+            if self._semantic_entries.get(bucket)and(embedding:=self._embed(prompt))and(cached:=self._semantic_lookup(bucket,embedding))is not None:console.print(Markdown(cached));console.print("\n[dim]∴Cached response (similar prompt)[/dim]");self.replayed=True;return cached
         try:
             start_time=time.time()
-            response=requests.post(url,json=payload,stream=True,timeout=60)
+            response=self.session.post(url,data=body,stream=True,timeout=60)
             response.raise_for_status()
-            full_response,token_count,prompt_tokens="",0,len(context.split())
+            parts,token_count,prompt_tokens,next_render,renderer=[],0,(len(context)+3)//4,0.0,StreamRenderer()
+            if self._prefetch_pool is None and config_value("PARALLEL_TOOL_EXECUTION",False):self._prefetch_pool=ThreadPoolExecutor(max_workers=1)
+            self._prefetched,self._prefetch_pos={},0 if self._prefetch_pool else -1
             with Live(Spinner("dots",text="Thinking..."),console=console,refresh_per_second=10)as live:
-                for line in response.iter_lines():
-                    if line:
-                        chunk=json.loads(line)
-                        if'response'in chunk:token=chunk['response'];full_response+=token;token_count+=1;live.update(Markdown(full_response))
-                        if chunk.get('done',False):self.thinking_time=time.time()-start_time;console.print(f"\n[dim]∴Thought for {self.thinking_time:.1f}s[/dim]");break
+                for chunk in iter_ndjson(response):
+                    if'response'in chunk:
+                        token=chunk['response'];parts.append(token);token_count+=1
+                        if token and(now:=time.monotonic())>=next_render:
+                            text="".join(parts);live.update(renderer.render(text));next_render=now+0.1
+                            if self._prefetch_pos>=0:self._prefetch_tool_calls(text)
+                    if chunk.get('done',False):token_count=chunk.get('eval_count',token_count);live.update(Markdown("".join(parts)));self.thinking_time=time.time()-start_time;console.print(f"\n[dim]∴Thought for {self.thinking_time:.1f}s[/dim]");break
+            full_response="".join(parts)
             self.token_tracker.add_tokens(prompt=prompt_tokens,completion=token_count)
+            if cache_key and full_response:self._store_response(cache_key,full_response)
+            # Only tool-free replies are reused for a similar prompt, their tool calls would act on a different request
+            if bucket and full_response and'TOOL['not in full_response and(embedding:=embedding or self._embed(prompt)):self._semantic_entries[bucket].append((*embedding,full_response))
             return full_response
         except requests.exceptions.Timeout:return "Error: Request timed out. The model might be too slow."
         except Exception as e:console.print(f"[red]Error calling Ollama: {e}[/red]");return ""
 
+    def _prefetch_tool_calls(self,text:str):
+        while match:=TOOL_NAME_RE.search(text,self._prefetch_pos):
+            if not(call:=TOOL_CALL_RE.match(text,match.start())):return
+            if match.group(1)not in PREFETCH_TOOLS:self._prefetch_pos=-1;return
+            key=(match.group(1),call.group(2).strip())
+            if key not in self._prefetched:self._prefetched[key]=self._prefetch_pool.submit(capture_output,self._dispatch_tool_call,{'tool':key[0],'args':key[1]})
+            self._prefetch_pos=call.end()
+
+    def _run_tool_call(self,call:Dict)->str:
+        if future:=self._prefetched.pop((call['tool'],call['args']),None):result,output=future.result();replay_output(output);return result
+        return self._dispatch_tool_call(call)
+
+    def _dispatch_tool_call(self,call:Dict)->str:
+        tool_name=call['tool']
+        if(tool:=self.tools.get(tool_name))is None:return f"Error: Unknown tool '{tool_name}'"
+        try:
+            args=self._parse_args(call['args'])
+            return tool.execute(*args)
+        except Exception as e:
+            error_msg=f"Error executing {tool_name}: {str(e)}"
+            console.print(f"[red]✗{error_msg}[/red]")
+            return error_msg
+
     def execute_tool_calls(self,response:str)->str:
-        tool_calls=self._extract_tool_calls(response)
+        tool_calls,cleaned_response=self._scan_tool_calls(response)
         if not tool_calls:return response
-        results=[]
-        for call in tool_calls:
-            tool_name=call['tool']
-            if tool_name not in self.tools:results.append(f"Error: Unknown tool '{tool_name}'");continue
-            try:
-                args=self._parse_args(call['args'])
-                tool=self.tools[tool_name]
-                result=tool.execute(*args)
-                results.append(result)
-            except Exception as e:
-                error_msg=f"Error executing {tool_name}: {str(e)}"
-                console.print(f"[red]✗{error_msg}[/red]")
-                results.append(error_msg)
-        tool_results="\n".join(results)
-        cleaned_response=re.sub(r'TOOL\[\w+\]\((.*?)\)(?=\s|$|TOOL)','',response,flags=re.DOTALL|re.MULTILINE).strip()
-        return cleaned_response+"\n\n"+tool_results
+        if config_value("PARALLEL_TOOL_EXECUTION",False)and len(tool_calls)>1:
+            # Only runs of consecutive read-only calls overlap; writes, commands and todo updates keep their order
+            results=[]
+            with ThreadPoolExecutor(max_workers=config_value("MAX_PARALLEL_TOOLS",3))as pool:
+                for read_only,group in itertools.groupby(tool_calls,key=lambda call:call['tool']in PREFETCH_TOOLS):
+                    if not read_only:results.extend(map(self._run_tool_call,group));continue
+                    for result,output in pool.map(functools.partial(capture_output,self._run_tool_call),group):replay_output(output);results.append(result)
+        else:results=[self._run_tool_call(call)for call in tool_calls]
+        return"\n\n".join((cleaned_response.strip(),"\n".join(results)))
 
     def _extract_file_mentions(self,text:str)->List[str]:
-        pattern=r'@([\w\-./]+\.\w+)'
-        matches=re.findall(pattern,text)
-        return matches
+        return list(dict.fromkeys(FILE_MENTION_RE.findall(text)))
 
-    def _get_available_files(self,pattern:str="*")->List[Path]:
+    def _get_available_files(self,pattern:str="*")->List[os.DirEntry]:
         try:
-            files=[]
-            for path in self.working_directory.rglob(pattern):
-                if any(part.startswith('.')for part in path.parts):continue
-                if any(ignore in str(path)for ignore in['node_modules','__pycache__','venv','.git']):continue
-                if path.is_file():files.append(path)
-            return sorted(files,key=lambda p:p.name)[:100]
+            root=os.fspath(self.working_directory)
+            parts=[None if part=='**'else glob_matcher(part)for part in pattern.replace(os.sep,'/').split('/')if part]
+            parts=tuple(m for i,m in enumerate(parts)if m is not None or(i and parts[i-1]is not None))
+            if len(parts)==1 and parts[0]is not None:match_name=parts[0];match=lambda e:match_name(e.name)
+            else:parts=parts if parts[:1]==(None,)else(None,)+parts;match=lambda e:glob_parts_match(parts,os.path.relpath(e.path,root).split(os.sep))
+            files=(entry for entry in iter_tree(root)if match(entry)and entry.is_file())
+            return heapq.nsmallest(100,files,key=operator.attrgetter('name'))
         except Exception as e:console.print(f"[red]Error listing files: {e}[/red]");return[]
 
     def _process_file_mentions(self,user_input:str)->str:
+        if'@'not in user_input:return user_input
         mentioned_files=self._extract_file_mentions(user_input)
         if not mentioned_files:return user_input
-        file_contexts=[]
-        for mentioned_file in mentioned_files:
-            file_path=Path(mentioned_file)if Path(mentioned_file).is_absolute()else self.working_directory/mentioned_file
-            if file_path.exists()and file_path.is_file():
-                try:
-                    content=file_path.read_text()[:5000]
-                    rel_path=file_path.relative_to(self.working_directory)if file_path.is_relative_to(self.working_directory)else file_path
-                    file_contexts.append(f"\n## Context from @{rel_path}\n```\n{content}\n```\n")
-                    console.print(f"[dim]📎Attached: {rel_path}[/dim]")
-                except Exception as e:console.print(f"[yellow]⚠️Could not read {mentioned_file}: {e}[/yellow]")
-        if file_contexts:enhanced_input=user_input+"\n\n"+"\n".join(file_contexts);return enhanced_input
-        return user_input
+        parts=[user_input]
+        def read(name):
+            try:return self._read_mention(name),None
+            except Exception as e:return None,e
+        if len(mentioned_files)<2:results=list(map(read,mentioned_files))
+        else:
+            with ThreadPoolExecutor(max_workers=min(8,len(mentioned_files)))as pool:results=list(pool.map(read,mentioned_files))
+        while len(self._mention_cache)>64:self._mention_cache.pop(next(iter(self._mention_cache)))
+        for mentioned_file,(result,error)in zip(mentioned_files,results):
+            if error:console.print(f"[yellow]⚠️Could not read {mentioned_file}: {error}[/yellow]");continue
+            if result is None:continue
+            rel_path,content=result
+            parts.append(f"## Context from @{rel_path}\n```\n{content}\n```")
+            console.print(f"[dim]📎Attached: {rel_path}[/dim]")
+        return"\n\n".join(parts)if len(parts)>1 else user_input
+
+    def _read_mention(self,mentioned_file:str)->Optional[tuple]:
+        file_path=self._resolve(mentioned_file)
+        try:st=file_path.stat()
+        except OSError:return None
+        if not stat.S_ISREG(st.st_mode):return None
+        key=(os.fspath(file_path),st.st_mtime_ns,st.st_size)
+        if(content:=self._mention_cache.get(key))is None:
+            with file_path.open('rb')as f:content=self._mention_cache[key]=f.read(20000).decode('utf-8','replace')[:5000]
+        try:return file_path.relative_to(self.working_directory),content
+        except ValueError:return file_path,content
+
+    def _prompt_budget(self)->int:
+        # num_ctx covers prompt and generation; past it Ollama drops the start of the prompt, i.e. the system prompt
+        cfg=model_config(self.model)
+        return int((cfg.context_window-cfg.num_predict if cfg else 4096-2048)*0.8)
+
+    def _history_context(self,reserved_tokens:int)->str:
+        budget,keep=self._prompt_budget()-reserved_tokens,0
+        for message in reversed(self.conversation_history):
+            if(budget:=budget-message["tokens"])<0:break
+            keep+=1
+        if not(dropped:=len(self.conversation_history)-keep):return"".join(self._context_parts)
+        return self._summarize_messages(itertools.islice(self.conversation_history,dropped))+"".join(itertools.islice(self._context_parts,dropped,None))
+
+    def _summarize_messages(self,messages)->str:
+        tools,files,last_reply,count={},{},"",0
+        for message in messages:
+            count+=1;tools.update(dict.fromkeys(TOOL_NAME_RE.findall(message["content"])));files.update(dict.fromkeys(HISTORY_FILE_RE.findall(message["content"])))
+            if message["role"]=="assistant":last_reply=message["content"]
+        lines=[f"Earlier conversation ({count} messages) summarized:"]
+        if tools:lines.append(f"-Tools used: {', '.join(tools)}")
+        if files:lines.append(f"-Files involved: {', '.join(files)}")
+        if last_reply:lines.append(f"-Last assistant reply began: {' '.join(last_reply[:300].split())}")
+        return "summary:"+"\n".join(lines)+"\n\n"
+
+    def _add_message(self,role:str,content:str):
+        self.conversation_history.append({"role":role,"content":content,"tokens":len(content)//4+1})
+        self._context_parts.append(f"{role}:{content}\n\n")
+
+    def clear_history(self):self.conversation_history.clear();self._context_parts.clear();self.close()
+
+    def close(self):
+        if self._prefetch_pool:self._prefetch_pool.shutdown(cancel_futures=True);self._prefetch_pool=None
+        self._prefetched.clear()
 
     def chat(self,user_input:str)->str:
         enhanced_input=self._process_file_mentions(user_input)
-        self.conversation_history.append({"role":"user","content":enhanced_input})
+        self._add_message("user",enhanced_input)
         response=self.call_ollama(enhanced_input)
-        final_response=self.execute_tool_calls(response)
-        self.conversation_history.append({"role":"assistant","content":final_response})
+        final_response=response if self.replayed else self.execute_tool_calls(response)
+        self._add_message("assistant",final_response)
         status_parts=[]
         current_todo=self.todo_list.get_current()
         if current_todo:status_parts.append(f"·{current_todo.active_form}")
-        elapsed=(datetime.now()-self.session_start).total_seconds()
+        elapsed=time.monotonic()-self._session_start_monotonic
         elapsed_str=f"{int(elapsed)}s"if elapsed<60 else f"{int(elapsed/60)}m"
         status_parts.append(f"·{elapsed_str}")
         status_parts.append(f"·{self.token_tracker.get_summary()}")
         if status_parts:console.print(f"\n[dim]{' '.join(status_parts)}[/dim]")
         return final_response
 
-def print_welcome():
-    welcome="""# 🤖 Local Code Agent
+WELCOME_PANEL=Panel(Markdown("""# 🤖 Local Code Agent
 **Powered by Ollama**•Running locally
 ## Commands
-`/help` `/init` `/files [pattern]` `/clear` `/model <name>` `/pwd` `/cd <path>` `/tools` `/todo` `/plan <request>` `/exit`
+`/help` `/init` `/files [pattern]` `/clear` `/model <name>` `/pwd` `/cd <path>` `/tools` `/todo` `/plan <request>` `/nocache` `/exit`
 ## Features
 - **File Mentions**: Use `@filename` to attach context
 - **Iterative Tasks**: Agent breaks down complex tasks
 - **Todo List**: Track multi-step tasks
-- **Project Context**: Use `/init` for codebase understanding"""
-    console.print(Panel(Markdown(welcome),border_style="cyan",title="Welcome",padding=1))
+- **Project Context**: Use `/init` for codebase understanding"""),border_style="cyan",title="Welcome",padding=1)
+
+def print_welcome():console.print(WELCOME_PANEL)
 
 def main():
     print_welcome()
     try:
-        response=requests.get("http://localhost:11434/api/tags",timeout=5)
+        session=new_session()
+        response=session.get("http://localhost:11434/api/tags",timeout=5)
         response.raise_for_status()
         models=response.json().get('models',[])
         if not models:console.print("[yellow]No models found. Install one with: ollama pull llama3.2[/yellow]");return
@@ -532,14 +923,15 @@ def main():
         table=Table(title="Available Models")
         table.add_column("Model",style="cyan")
         table.add_column("Size",style="magenta")
-        for model in models[:10]:size=model.get('size',0)/(1024**3);table.add_row(model['name'],f"{size:.1f}GB")
+        for model in models[:10]:table.add_row(model['name'],f"{model.get('size',0)/(1<<30):.1f}GB")
         console.print(table)
         model_names=[m['name']for m in models]
         default_model=model_names[0]
         model=Prompt.ask("\nSelect model",default=default_model,choices=model_names)
     except requests.exceptions.Timeout:console.print("[red]✗Could not connect to Ollama (timeout)[/red]");console.print("Make sure Ollama is running: [yellow]ollama serve[/yellow]");return
     except Exception as e:console.print(f"[red]✗Error connecting to Ollama: {e}[/red]");return
-    agent=EnhancedCodeAgent(model=model)
+    agent=EnhancedCodeAgent(model=model,session=session)
+    agent.preload_model()
     console.print(f"\n[cyan]🚀Agent ready with {model}[/cyan]")
     console.print(f"[dim]Working directory: {agent.working_directory}[/dim]\n")
     while True:
@@ -549,22 +941,19 @@ def main():
             if user_input.startswith('/'):
                 cmd_parts=user_input.split(maxsplit=1)
                 cmd=cmd_parts[0]
-                if cmd=='/exit':console.print("[yellow]👋Goodbye![/yellow]");break
-                elif cmd=='/clear':agent.conversation_history=[];console.clear();console.print("[green]✓Conversation cleared[/green]");continue
+                if cmd=='/exit':console.print("[yellow]👋Goodbye![/yellow]");agent.close();break
+                elif cmd=='/clear':agent.clear_history();console.clear();console.print("[green]✓Conversation cleared[/green]");continue
                 elif cmd=='/help'or cmd=='/commands':print_welcome();continue
                 elif cmd=='/files':
                     pattern=cmd_parts[1]if len(cmd_parts)>1 else"*"
                     files=agent._get_available_files(pattern)
                     if files:
                         console.print(f"\n[cyan]📁Available files (use @filename to mention):[/cyan]\n")
-                        for file in files[:50]:
-                            rel_path=file.relative_to(agent.working_directory)
-                            size=file.stat().st_size
-                            size_str=agent._format_size(size)
-                            console.print(f"@{rel_path}[dim]({size_str})[/dim]")
+                        console.print(Text("\n").join(Text.assemble(f"@{os.path.relpath(entry.path,agent.working_directory)}",(f"({agent._format_size(entry.stat().st_size)})","dim"))for entry in files[:50]))
                         if len(files)>50:console.print(f"\n[dim]...and {len(files)-50} more files[/dim]")
                     else:console.print(f"[yellow]No files found matching pattern: {pattern}[/yellow]")
                     continue
+                elif cmd=='/nocache':agent.use_cache=not agent.use_cache;console.print(f"[green]✓Response cache {'enabled'if agent.use_cache else'disabled'}[/green]");continue
                 elif cmd=='/pwd':console.print(f"[blue]{agent.working_directory}[/blue]");continue
                 elif cmd=='/cd':
                     if len(cmd_parts)>1:
@@ -573,7 +962,7 @@ def main():
                         else:console.print("[red]Directory not found[/red]")
                     continue
                 elif cmd=='/model':
-                    if len(cmd_parts)>1:agent.model=cmd_parts[1];console.print(f"[green]✓Switched to {agent.model}[/green]")
+                    if len(cmd_parts)>1:agent.model=cmd_parts[1];agent.preload_model();console.print(f"[green]✓Switched to {agent.model}[/green]")
                     continue
                 elif cmd=='/tools':
                     table=Table(title="Available Tools")
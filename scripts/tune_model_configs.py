@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Offline Bayesian search over Ollama context/generation options per model.
+Prints values to merge into the [MODEL_CONFIGS."<model>"] tables of config.toml.
+
+Requires: pip install scikit-optimize
+Usage: python3 scripts/tune_model_configs.py qwen2.5-coder:7b llama3.2:3b --calls 20
+"""
+import argparse
+import sys
+
+import requests
+
+try:
+    from skopt import Optimizer
+    from skopt.space import Integer
+except ImportError:
+    sys.exit("scikit-optimize is required: pip install scikit-optimize")
+
+# Fixed corpus so runs are comparable; the short prompt gets a short answer and the
+# long one a long review, measuring tokens_per_sec_short / tokens_per_sec_long
+PROMPTS = {
+    "short_context": "Write a Python function that reverses a string.",
+    "long_context": "Review the following code and suggest improvements:\n" + "def f(x):\n    return [i * 2 for i in range(x)]\n" * 150,
+}
+
+# Only throughput knobs are searched; top_k/top_p change output quality, not speed,
+# so they stay as set by hand. context_window is searched as headroom above the
+# prompt plus num_predict: a smaller num_ctx makes Ollama truncate the prompt and
+# report a misleadingly high tokens/sec.
+DIMENSIONS = [
+    Integer(512, 4096, name="num_predict"),
+    Integer(0, 4096, name="context_headroom"),
+]
+
+
+def generate(session, base_url, model, prompt, options):
+    r = session.post(f"{base_url}/api/generate", json={"model": model, "prompt": prompt, "stream": False, "options": options}, timeout=600)
+    r.raise_for_status()
+    return r.json()
+
+
+def prompt_tokens(session, base_url, model, prompt):
+    # A character count bounds the token count, so this num_ctx never truncates the prompt
+    return generate(session, base_url, model, prompt, {"num_ctx": len(prompt) + 64, "num_predict": 1}).get("prompt_eval_count", 0)
+
+
+def options_for(params, n_prompt):
+    num_predict, headroom = map(int, params)
+    return {"num_ctx": n_prompt + num_predict + headroom, "num_predict": num_predict}
+
+
+def tokens_per_sec(session, base_url, model, prompt, options):
+    data = generate(session, base_url, model, prompt, options)
+    # eval_duration is reported in nanoseconds
+    return data.get("eval_count", 0) / max(data.get("eval_duration", 1) / 1e9, 1e-9)
+
+
+def format_options(options):
+    return f"num_predict = {options['num_predict']}\ncontext_window = {options['num_ctx']}"
+
+
+def tune(session, base_url, model, prompt, calls):
+    try:
+        n_prompt = prompt_tokens(session, base_url, model, prompt)
+    except requests.RequestException as e:
+        print(f"  {model}: {e}", file=sys.stderr)
+        return (0.0, None)
+    opt = Optimizer(DIMENSIONS, base_estimator="GP", random_state=0)
+    best = (0.0, None)
+    for _ in range(calls):
+        params = opt.ask()
+        options = options_for(params, n_prompt)
+        try:
+            tps = tokens_per_sec(session, base_url, model, prompt, options)
+        except requests.RequestException as e:
+            print(f"  {model}: {e}", file=sys.stderr)
+            tps = 0.0
+        opt.tell(params, -tps)
+        if tps > best[0]:
+            best = (tps, options)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("models", nargs="+")
+    parser.add_argument("--calls", type=int, default=20, help="evaluations per model and prompt bucket")
+    parser.add_argument("--url", default="http://localhost:11434")
+    args = parser.parse_args()
+    # One keep-alive connection for every evaluation
+    session = requests.Session()
+    for model in args.models:
+        best = {bucket: tune(session, args.url, model, prompt, args.calls) for bucket, prompt in PROMPTS.items()}
+        (short_tps, short_params), (long_tps, long_params) = best["short_context"], best["long_context"]
+        # One table per model (TOML forbids declaring it twice): the long-context winner must fit
+        # long prompts, so its options are used and the short-context winner is noted as a comment
+        params = long_params or short_params
+        if params is None:
+            print(f"# {model}: no successful run", file=sys.stderr)
+            continue
+        print(f'[MODEL_CONFIGS."{model}"]')
+        if short_params is not None and short_params != params:
+            print("# short_context winner: " + format_options(short_params).replace("\n", ", "))
+        print(format_options(params))
+        print(f"tokens_per_sec_short = {short_tps:.1f}\ntokens_per_sec_long = {long_tps:.1f}\n")
+
+
+if __name__ == "__main__":
+    main()